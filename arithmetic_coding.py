@@ -1,8 +1,33 @@
+import os
 import sys
+import mmap
 import pickle
+from collections import Counter
+from multiprocessing import Pool, shared_memory
 from pathlib import Path
 
 
+# Порог размера файла, начиная с которого частоты считаются параллельно
+PARALLEL_THRESHOLD = 64 * 1024 * 1024
+
+# Размер блока, который рабочий процесс декодирует за один раз
+PARALLEL_CHUNK_SIZE = 1 << 20
+
+# Слоты счётчиков: по одному на каждый код Unicode и один для пар '\r\n'
+UNICODE_SLOTS = 0x110000
+CRLF_SLOT = UNICODE_SLOTS
+COUNT_SLOTS = UNICODE_SLOTS + 1
+
+# Признак блока индекса сегментов
+INDEX_MAGIC = b'ACSEGIDX'
+
+# Блок индекса: смещение сегмента, смещение предыдущего блока, номер сегмента, признак
+INDEX_BLOCK_SIZE = 8 + 8 + 4 + len(INDEX_MAGIC)
+
+# Размер окна при поиске последнего целого блока индекса
+RECOVERY_CHUNK_SIZE = 1 << 20
+
+
 class ArithmeticCoder:
     """Арифметическое кодирование с целочисленной арифметикой"""
     
@@ -18,11 +43,16 @@ class ArithmeticCoder:
         
     def build_frequency_table(self, data):
         """Построение таблицы частот"""
-        self.frequencies = {}
+        frequencies = {}
         
         for symbol in data:
-            self.frequencies[symbol] = self.frequencies.get(symbol, 0) + 1
+            frequencies[symbol] = frequencies.get(symbol, 0) + 1
         
+        return self.set_frequencies(frequencies)
+    
+    def set_frequencies(self, frequencies):
+        """Установка готовой таблицы частот и построение кумулятивных частот"""
+        self.frequencies = dict(frequencies)
         self.frequencies['EOF'] = 1
         
         self.cumulative_freq = {}
@@ -36,12 +66,16 @@ class ArithmeticCoder:
         
         return self.frequencies
     
-    def encode(self, data):
-        """Кодирование данных"""
+    def encode(self, data, build_table=True):
+        """Кодирование данных
+        
+        При build_table=False используется уже построенная таблица частот.
+        """
         if not data:
             return []
         
-        self.build_frequency_table(data)
+        if build_table:
+            self.build_frequency_table(data)
 
         low = 0
         high = self.MAX_CODE
@@ -195,38 +229,340 @@ def bytes_to_bits(data, total_bits):
     return bits[:total_bits]
 
 
-def compress_file(input_path, output_path):
-    """Сжатие файла"""
-    print(f"Чтение {input_path}...", flush=True)
+def _align_utf8(mm, pos, end):
+    """Сдвиг позиции на начало символа UTF-8, не разрывая пару '\\r\\n'"""
+    while pos < end and (mm[pos] & 0xC0) == 0x80:
+        pos += 1
     
-    with open(input_path, 'r', encoding='utf-8') as f:
-        text = f.read()
+    if 0 < pos < end and mm[pos] == 0x0A and mm[pos - 1] == 0x0D:
+        pos += 1
     
-    if not text:
-        print("Файл пустой!")
-        return
+    return pos
+
+
+def _count_range(task):
+    """Подсчёт символов в диапазоне файла (выполняется в рабочем процессе)
     
-    print(f"Размер: {len(text)} символов", flush=True)
-    print("Построение таблицы частот...", flush=True)
+    Возвращает коды встреченных символов, чтобы не просматривать весь массив.
+    """
+    input_path, start, end, shm_name, chunk_size = task
     
-    coder = ArithmeticCoder()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    counts = shm.buf.cast('q')
+    codes = set()
+    try:
+        with open(input_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), end, access=mmap.ACCESS_READ) as mm:
+                pos = start
+                while pos < end:
+                    stop = _align_utf8(mm, min(pos + chunk_size, end), end)
+                    text = mm[pos:stop].decode('utf-8')
+                    
+                    for symbol, count in Counter(text).items():
+                        code = ord(symbol)
+                        counts[code] += count
+                        codes.add(code)
+                    counts[CRLF_SLOT] += text.count('\r\n')
+                    
+                    pos = stop
+    finally:
+        counts.release()
+        shm.close()
     
-    print("Кодирование...", flush=True)
+    return codes
+
+
+def count_frequencies_parallel(input_path, workers=None, chunk_size=PARALLEL_CHUNK_SIZE, size=None):
+    """Параллельный подсчёт частот символов файла
     
-    bits = coder.encode(text)
+    Файл отображается в память и делится на диапазоны по границам символов
+    UTF-8. Каждый рабочий процесс считает свой диапазон в отдельный массив
+    в разделяемой памяти, затем массивы суммируются. Переводы строк
+    учитываются так же, как при чтении файла в текстовом режиме.
     
-    print(f"Закодировано в {len(bits)} бит", flush=True)
-    print("Сохранение...", flush=True)
+    size - число считаемых байтов от начала файла (по умолчанию весь файл).
+    Позволяет считать тот же снимок, что был прочитан, даже если файл растёт.
+    """
+    workers = workers or os.cpu_count() or 1
+    if size is None:
+        size = Path(input_path).stat().st_size
     
-    byte_data, padding = bits_to_bytes(bits)
+    if size == 0:
+        return {}
     
-    with open(output_path, 'wb') as f:
-        f.write(len(text).to_bytes(4, 'big'))
+    with open(input_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+            bounds = [0]
+            for i in range(1, workers):
+                bounds.append(max(bounds[-1], _align_utf8(mm, size * i // workers, size)))
+            bounds.append(size)
+    
+    ranges = [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+    
+    # Новые сегменты разделяемой памяти уже заполнены нулями
+    blocks = []
+    try:
+        for _ in ranges:
+            blocks.append(shared_memory.SharedMemory(create=True, size=COUNT_SLOTS * 8))
+        
+        tasks = [
+            (str(input_path), start, end, shm.name, chunk_size)
+            for (start, end), shm in zip(ranges, blocks)
+        ]
+        
+        with Pool(len(tasks)) as pool:
+            codes = set().union(*pool.map(_count_range, tasks))
+        
+        views = [shm.buf.cast('q') for shm in blocks]
+        try:
+            totals = {chr(code): sum(counts[code] for counts in views) for code in codes}
+            crlf = sum(counts[CRLF_SLOT] for counts in views)
+        finally:
+            for counts in views:
+                counts.release()
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    
+    newlines = totals.pop('\n', 0) + totals.pop('\r', 0) - crlf
+    if newlines:
+        totals['\n'] = newlines
+    
+    return totals
+
+
+def check_parallel_counting():
+    """Проверка: параллельный подсчёт совпадает с build_frequency_table
+    
+    Текст содержит '\\r\\n', одиночные '\\r' и многобайтовые символы, а малый
+    размер блока и разное число процессов ставят границы диапазонов на них.
+    Также проверяется, что дописанные после чтения данные не учитываются.
+    """
+    import tempfile
+    
+    pattern = 'ab\r\nщ€\r😀\n\r\n\r\rя'
+    ok = True
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'check.txt'
+        
+        for shift in range(len(pattern)):
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write((pattern[shift:] + pattern) * 5)
+            
+            with open(path, 'r', encoding='utf-8') as f:
+                expected = ArithmeticCoder().build_frequency_table(f.read())
+            
+            for workers in (1, 2, 3, 7, 16):
+                for chunk_size in (1, 3, PARALLEL_CHUNK_SIZE):
+                    coder = ArithmeticCoder()
+                    coder.set_frequencies(count_frequencies_parallel(path, workers, chunk_size))
+                    
+                    if coder.frequencies != expected:
+                        ok = False
+                        print(f"✗ Сдвиг {shift}, процессов {workers}, блок {chunk_size}: "
+                              f"{coder.frequencies} != {expected}")
+            
+            # Файл дописывается после чтения: считается только прочитанный снимок
+            text, size = _read_text(path)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write('новое\r\n')
+            
+            if _build_model(path, text, size, workers=3).frequencies != expected:
+                ok = False
+                print(f"✗ Сдвиг {shift}: подсчёт захватил дописанные данные")
+    
+    print("✓ Параллельный подсчёт совпадает" if ok else "✗ Параллельный подсчёт расходится")
+    
+    return ok
+
+
+def check_archive():
+    """Проверка формата архива: сжатие, дописывание и восстановление
+    
+    Проверяются дописывание с наследованием модели и без него, архив
+    старого формата, обрыв дописывания на каждом байте, обрыв первой записи
+    в пустой архив и недописанный блок индекса после архива старого формата.
+    """
+    import io
+    import tempfile
+    import contextlib
+    
+    texts = {
+        'a': 'hello world\n' * 20,
+        'b': 'world hello\n' * 5,
+        'c': 'новые символы ZZ\n' * 3,
+    }
+    ok = True
+    
+    def expect(name, actual, expected):
+        nonlocal ok
+        if actual != expected:
+            ok = False
+            print(f"✗ {name}: {actual!r} != {expected!r}")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        out = tmp / 'out.txt'
+        
+        for name, text in texts.items():
+            (tmp / f'{name}.txt').write_text(text, encoding='utf-8')
+        
+        def txt(name):
+            return tmp / f'{name}.txt'
         
-        f.write(len(bits).to_bytes(4, 'big'))
+        def run(func, *args):
+            with contextlib.redirect_stdout(io.StringIO()):
+                func(*args)
         
-        f.write(padding.to_bytes(1, 'big'))
+        def unpack(archive):
+            run(decompress_file, archive, out)
+            return out.read_text(encoding='utf-8')
         
+        def inherited_flags(archive):
+            with open(archive, 'rb') as f:
+                offsets = _read_index(f)
+                flags = []
+                for offset in offsets:
+                    f.seek(offset)
+                    flags.append(_read_segment_header(f)[3] is None)
+            return flags
+        
+        a, b, c = texts['a'], texts['b'], texts['c']
+        
+        # Дописывание с наследованием модели и без него
+        archive = tmp / 'x.bin'
+        run(compress_file, txt('a'), archive)
+        run(append_file, txt('b'), archive, True)
+        run(append_file, txt('c'), archive, True)
+        run(append_file, txt('c'), archive, True)
+        run(append_file, txt('a'), archive)
+        expect("дописывание", unpack(archive), a + b + c + c + a)
+        expect("наследование модели", inherited_flags(archive), [False, True, False, True, False])
+        
+        # Отсутствующий и пустой архив создаются
+        archive = tmp / 'new.bin'
+        run(append_file, txt('b'), archive)
+        expect("отсутствующий архив", unpack(archive), b)
+        archive.write_bytes(b'')
+        run(append_file, txt('b'), archive)
+        expect("пустой архив", unpack(archive), b)
+        
+        # Архив старого формата: один сегмент без индекса
+        coder = ArithmeticCoder()
+        bits = coder.encode(a)
+        with open(tmp / 'legacy.bin', 'wb') as f:
+            _write_segment(f, a, bits, coder)
+        legacy = (tmp / 'legacy.bin').read_bytes()
+        
+        archive = tmp / 'old.bin'
+        archive.write_bytes(legacy)
+        expect("старый формат", unpack(archive), a)
+        run(append_file, txt('b'), archive)
+        expect("дописывание в старый формат", unpack(archive), a + b)
+        
+        # Недописанный блок индекса после архива старого формата
+        for cut in range(1, INDEX_BLOCK_SIZE):
+            archive.write_bytes(legacy + bytes(cut))
+            expect(f"старый формат + {cut} байт", unpack(archive), a)
+            run(append_file, txt('b'), archive)
+            expect(f"дописывание в старый формат + {cut} байт", unpack(archive), a + b)
+        
+        # Обрыв первой записи в пустой архив
+        archive = tmp / 'first.bin'
+        run(append_file, txt('a'), archive)
+        full = archive.read_bytes()
+        for cut in range(1, len(full)):
+            archive.write_bytes(full[:cut])
+            before = a if cut >= len(legacy) else ''
+            expect(f"обрыв первой записи на {cut}", unpack(archive), before)
+            run(append_file, txt('b'), archive)
+            expect(f"дописывание после обрыва первой записи на {cut}", unpack(archive), before + b)
+        
+        # Обрыв дописывания на каждом байте
+        archive = tmp / 'cut.bin'
+        run(compress_file, txt('a'), archive)
+        run(append_file, txt('b'), archive)
+        base = archive.read_bytes()
+        run(append_file, txt('c'), archive, True)
+        full = archive.read_bytes()
+        for cut in range(len(base), len(full)):
+            archive.write_bytes(full[:cut])
+            expect(f"обрыв дописывания на {cut}", unpack(archive), a + b)
+            run(append_file, txt('c'), archive, True)
+            expect(f"повторное дописывание после обрыва на {cut}", archive.read_bytes(), full)
+        
+        # Повреждённый архив не затирает выходной файл
+        count_at = len(full) - len(INDEX_MAGIC) - 4
+        archive.write_bytes(full[:count_at] + (99).to_bytes(4, 'big') + full[count_at + 4:])
+        out.write_text('прежнее содержимое', encoding='utf-8')
+        try:
+            unpack(archive)
+            expect("повреждённый архив", "нет ошибки", "ValueError")
+        except ValueError:
+            pass
+        expect("выходной файл при ошибке", out.read_text(encoding='utf-8'), 'прежнее содержимое')
+    
+    print("✓ Формат архива в порядке" if ok else "✗ Ошибки в формате архива")
+    
+    return ok
+
+
+def _read_text(input_path):
+    """Чтение текста файла и числа прочитанных байтов
+    
+    Переводы строк приводятся к '\\n', как при чтении в текстовом режиме.
+    """
+    with open(input_path, 'rb') as f:
+        data = f.read()
+    
+    text = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+    
+    return text, len(data)
+
+
+def _build_model(input_path, text, size, workers=None):
+    """Построение таблицы частот для текста файла
+    
+    size - число байтов, из которых прочитан text; параллельный подсчёт
+    ведётся только по ним. workers - число процессов для подсчёта частот.
+    По умолчанию файлы больше PARALLEL_THRESHOLD считаются на всех ядрах.
+    """
+    if workers is None:
+        if size >= PARALLEL_THRESHOLD:
+            workers = os.cpu_count() or 1
+        else:
+            workers = 1
+    
+    coder = ArithmeticCoder()
+    
+    if workers > 1:
+        coder.set_frequencies(count_frequencies_parallel(input_path, workers, size=size))
+    else:
+        coder.build_frequency_table(text)
+    
+    return coder
+
+
+def _write_segment(f, text, bits, coder, inherited=False):
+    """Запись сегмента: заголовок, таблицы частот и закодированные данные
+    
+    Для inherited=True таблицы частот не сохраняются (размер 0), сегмент
+    использует модель предыдущего сегмента.
+    """
+    byte_data, padding = bits_to_bytes(bits)
+    
+    f.write(len(text).to_bytes(4, 'big'))
+    
+    f.write(len(bits).to_bytes(4, 'big'))
+    
+    f.write(padding.to_bytes(1, 'big'))
+    
+    if inherited:
+        f.write((0).to_bytes(4, 'big'))
+        f.write((0).to_bytes(4, 'big'))
+    else:
         freq_data = pickle.dumps(coder.frequencies)
         f.write(len(freq_data).to_bytes(4, 'big'))
         f.write(freq_data)
@@ -234,10 +570,260 @@ def compress_file(input_path, output_path):
         cum_freq_data = pickle.dumps(coder.cumulative_freq)
         f.write(len(cum_freq_data).to_bytes(4, 'big'))
         f.write(cum_freq_data)
+    
+    f.write(coder.total_freq.to_bytes(4, 'big'))
+    
+    f.write(byte_data)
+
+
+def _read_segment_header(f):
+    """Чтение заголовка сегмента
+    
+    Для сегмента с унаследованной моделью таблицы частот равны None.
+    """
+    length = int.from_bytes(f.read(4), 'big')
+    
+    bits_count = int.from_bytes(f.read(4), 'big')
+    
+    padding = int.from_bytes(f.read(1), 'big')
+    
+    frequencies = None
+    cumulative_freq = None
+    
+    freq_len = int.from_bytes(f.read(4), 'big')
+    if freq_len:
+        frequencies = pickle.loads(f.read(freq_len))
+    
+    cum_freq_len = int.from_bytes(f.read(4), 'big')
+    if cum_freq_len:
+        cumulative_freq = pickle.loads(f.read(cum_freq_len))
+    
+    total_freq = int.from_bytes(f.read(4), 'big')
+    
+    return length, bits_count, padding, frequencies, cumulative_freq, total_freq
+
+
+def _segment_end(f, offset):
+    """Позиция конца сегмента по его заголовку (без чтения таблиц частот)"""
+    f.seek(offset + 4)
+    bits_count = int.from_bytes(f.read(4), 'big')
+    padding = int.from_bytes(f.read(1), 'big')
+    
+    freq_len = int.from_bytes(f.read(4), 'big')
+    f.seek(freq_len, os.SEEK_CUR)
+    cum_freq_len = int.from_bytes(f.read(4), 'big')
+    f.seek(cum_freq_len, os.SEEK_CUR)
+    
+    return f.tell() + 4 + (bits_count + padding) // 8
+
+
+def _write_index_block(f, offset, previous, count):
+    """Запись блока индекса сразу после сегмента
+    
+    Блок хранит смещение сегмента, смещение предыдущего блока и номер
+    сегмента. Блоки образуют цепочку, поэтому существующие данные архива
+    при дописывании не перезаписываются.
+    """
+    f.write(offset.to_bytes(8, 'big'))
+    f.write(previous.to_bytes(8, 'big'))
+    f.write(count.to_bytes(4, 'big'))
+    f.write(INDEX_MAGIC)
+
+
+def _read_index_block(f, pos):
+    """Чтение блока индекса; None, если в позиции нет блока"""
+    if pos < 0:
+        return None
+    
+    f.seek(pos)
+    data = f.read(INDEX_BLOCK_SIZE)
+    
+    if len(data) != INDEX_BLOCK_SIZE or data[20:] != INDEX_MAGIC:
+        return None
+    
+    return (int.from_bytes(data[:8], 'big'),
+            int.from_bytes(data[8:16], 'big'),
+            int.from_bytes(data[16:20], 'big'))
+
+
+def _check_index_block(block, pos, count=None):
+    """Проверка блока индекса в позиции pos; count - ожидаемый номер сегмента"""
+    if block is None:
+        raise ValueError(f"Архив повреждён: нет блока индекса в позиции {pos}")
+    
+    offset, previous, block_count = block
+    
+    if block_count == 0 or offset >= pos or (count is not None and block_count != count):
+        raise ValueError(f"Архив повреждён: неверный блок индекса в позиции {pos}")
+    
+    if block_count == 1 and offset != 0:
+        raise ValueError("Архив повреждён: первый сегмент не в начале файла")
+    
+    if block_count > 1 and previous + INDEX_BLOCK_SIZE != offset:
+        raise ValueError(f"Архив повреждён: неверный блок индекса в позиции {pos}")
+    
+    return block
+
+
+def _walk_index(f, pos):
+    """Чтение смещений сегментов по цепочке блоков, начиная с блока в pos"""
+    offsets = []
+    count = None
+    
+    while True:
+        offset, previous, count = _check_index_block(_read_index_block(f, pos), pos, count)
+        offsets.append(offset)
+        
+        if count == 1:
+            break
+        
+        pos = previous
+        count -= 1
+    
+    offsets.reverse()
+    
+    return offsets
+
+
+def _recover_index(f, size):
+    """Поиск последнего целого блока индекса перед недописанным хвостом
+    
+    Возвращает позицию найденного блока или None.
+    """
+    pos = size
+    
+    while pos > 0:
+        start = max(0, pos - RECOVERY_CHUNK_SIZE)
+        f.seek(start)
+        chunk = f.read(pos - start + len(INDEX_MAGIC) - 1)
+        
+        found = chunk.rfind(INDEX_MAGIC)
+        while found != -1:
+            block_pos = start + found + len(INDEX_MAGIC) - INDEX_BLOCK_SIZE
+            try:
+                _walk_index(f, block_pos)
+                return block_pos
+            except ValueError:
+                found = chunk.rfind(INDEX_MAGIC, 0, found + len(INDEX_MAGIC) - 1)
+        
+        pos = start
+    
+    return None
+
+
+def _locate_index(f):
+    """Поиск последнего блока индекса
+    
+    Возвращает позицию последнего блока (None, если блоков нет), конец
+    данных архива (сюда пишется следующий сегмент) и признак архива старого
+    формата. Проверяется только последний блок, цепочка не обходится.
+    
+    Недописанный хвост после прерванного дописывания пропускается:
+    - файл старого формата с коротким хвостом (недописанный первый блок
+      индекса) читается как один сегмент;
+    - если целого блока нет и первый сегмент не дописан, архив пуст.
+    """
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    
+    if size == 0:
+        return None, 0, False
+    
+    pos = size - INDEX_BLOCK_SIZE
+    block = _read_index_block(f, pos)
+    if block is not None:
+        _check_index_block(block, pos)
+        return pos, size, False
+    
+    first_end = _segment_end(f, 0)
+    if first_end <= size < first_end + INDEX_BLOCK_SIZE:
+        if size > first_end:
+            print(f"Пропущена недописанная запись в конце архива ({size - first_end} байт)", flush=True)
+        return None, first_end, True
+    
+    pos = _recover_index(f, size)
+    if pos is not None:
+        end = pos + INDEX_BLOCK_SIZE
+        print(f"Пропущена недописанная запись в конце архива ({size - end} байт)", flush=True)
+        return pos, end, False
+    
+    if first_end > size:
+        print(f"Пропущена недописанная запись в конце архива ({size} байт)", flush=True)
+        return None, 0, False
+    
+    raise ValueError("Архив повреждён: индекс сегментов не найден")
+
+
+def _read_index(f):
+    """Чтение смещений всех сегментов с проверкой всей цепочки индекса"""
+    pos, _, legacy = _locate_index(f)
+    
+    if legacy:
+        return [0]
+    
+    if pos is None:
+        return []
+    
+    return _walk_index(f, pos)
+
+
+def _sync(f):
+    """Сброс записанных данных на диск"""
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _find_model(f, pos):
+    """Поиск модели последнего сегмента, хранящего таблицы частот
+    
+    Цепочка блоков проходится от блока в pos только до такого сегмента.
+    """
+    count = None
+    
+    while True:
+        offset, previous, count = _check_index_block(_read_index_block(f, pos), pos, count)
+        
+        f.seek(offset)
+        _, _, _, frequencies, cumulative_freq, total_freq = _read_segment_header(f)
+        
+        if frequencies is not None:
+            return frequencies, cumulative_freq, total_freq
         
-        f.write(coder.total_freq.to_bytes(4, 'big'))
+        if count == 1:
+            return None
         
-        f.write(byte_data)
+        pos = previous
+        count -= 1
+
+
+def compress_file(input_path, output_path, workers=None):
+    """Сжатие файла
+    
+    workers - число процессов для подсчёта частот (см. _build_model).
+    """
+    print(f"Чтение {input_path}...", flush=True)
+    
+    text, size = _read_text(input_path)
+    
+    if not text:
+        print("Файл пустой!")
+        return
+    
+    print(f"Размер: {len(text)} символов", flush=True)
+    print("Построение таблицы частот...", flush=True)
+    
+    coder = _build_model(input_path, text, size, workers)
+    
+    print("Кодирование...", flush=True)
+    
+    bits = coder.encode(text, build_table=False)
+    
+    print(f"Закодировано в {len(bits)} бит", flush=True)
+    print("Сохранение...", flush=True)
+    
+    with open(output_path, 'wb') as f:
+        _write_segment(f, text, bits, coder)
+        _write_index_block(f, 0, 0, 1)
     
     original = Path(input_path).stat().st_size
     compressed = Path(output_path).stat().st_size
@@ -250,47 +836,112 @@ def compress_file(input_path, output_path):
     print(f"  Бит на символ: {len(bits) / len(text):.3f}")
 
 
-def decompress_file(input_path, output_path):
-    """Распаковка файла"""
+def append_file(input_path, archive_path, inherit_model=False, workers=None):
+    """Дописывание файла в архив новым сегментом
+    
+    Существующие сегменты не перекодируются и не перезаписываются: новый
+    сегмент пишется в конец архива и сбрасывается на диск, только затем
+    пишется его блок индекса. Если дописывание прервано, архив читается
+    без недописанного сегмента. Отсутствующий или пустой архив создаётся.
+    При inherit_model=True сегмент использует модель последнего сегмента,
+    если в ней есть все символы новых данных, иначе строится своя модель.
+    """
     print(f"Чтение {input_path}...", flush=True)
     
-    with open(input_path, 'rb') as f:
-        length = int.from_bytes(f.read(4), 'big')
-      
-        bits_count = int.from_bytes(f.read(4), 'big')
-        
-        padding = int.from_bytes(f.read(1), 'big')
-        
-        freq_len = int.from_bytes(f.read(4), 'big')
-        freq_data = f.read(freq_len)
-        frequencies = pickle.loads(freq_data)
-        
-        cum_freq_len = int.from_bytes(f.read(4), 'big')
-        cum_freq_data = f.read(cum_freq_len)
-        cumulative_freq = pickle.loads(cum_freq_data)
-        
-        total_freq = int.from_bytes(f.read(4), 'big')
-        
-        encoded_data = f.read()
+    text, size = _read_text(input_path)
     
-    print(f"Распаковка {length} символов...", flush=True)
-    print("Восстановление битов...", flush=True)
+    if not text:
+        print("Файл пустой!")
+        return
     
-    bits = bytes_to_bits(encoded_data, bits_count)
+    print(f"Размер: {len(text)} символов", flush=True)
+    print("Построение таблицы частот...", flush=True)
     
-    print("Декодирование...", flush=True)
+    coder = _build_model(input_path, text, size, workers)
     
-    coder = ArithmeticCoder()
-    coder.frequencies = frequencies
-    coder.cumulative_freq = cumulative_freq
-    coder.total_freq = total_freq
+    mode = 'r+b' if Path(archive_path).exists() else 'w+b'
     
-    result = coder.decode(bits, length)
+    with open(archive_path, mode) as f:
+        pos, end, legacy = _locate_index(f)
+        
+        f.seek(end)
+        f.truncate()
+        
+        if legacy:
+            _write_index_block(f, 0, 0, 1)
+            _sync(f)
+            pos = end
+            end += INDEX_BLOCK_SIZE
+        
+        count = _read_index_block(f, pos)[2] if pos is not None else 0
+        
+        inherited = False
+        if inherit_model and pos is not None:
+            model = _find_model(f, pos)
+            
+            if model is not None and coder.frequencies.keys() <= model[0].keys():
+                coder.frequencies, coder.cumulative_freq, coder.total_freq = model
+                inherited = True
+            else:
+                print("Модель архива не подходит, строится своя", flush=True)
+        
+        print("Кодирование...", flush=True)
+        
+        bits = coder.encode(text, build_table=False)
+        
+        print(f"Закодировано в {len(bits)} бит", flush=True)
+        print("Сохранение...", flush=True)
+        
+        f.seek(end)
+        _write_segment(f, text, bits, coder, inherited)
+        _sync(f)
+        
+        _write_index_block(f, end, pos if pos is not None else 0, count + 1)
+        _sync(f)
     
-    print(f"Запись в {output_path}...", flush=True)
+    print(f"\n✓ Готово!")
+    print(f"  Сегментов: {count + 1}")
+    print(f"  Бит на символ: {len(bits) / len(text):.3f}")
+
+
+def decompress_file(input_path, output_path):
+    """Распаковка файла (всех сегментов по порядку)"""
+    print(f"Чтение {input_path}...", flush=True)
     
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(''.join(result))
+    with open(input_path, 'rb') as f:
+        # Индекс проверяется до открытия (и очистки) выходного файла
+        offsets = _read_index(f)
+        
+        with open(output_path, 'w', encoding='utf-8') as out:
+            model = None
+            
+            for number, offset in enumerate(offsets, 1):
+                f.seek(offset)
+                
+                (length, bits_count, padding,
+                 frequencies, cumulative_freq, total_freq) = _read_segment_header(f)
+                
+                if frequencies is None:
+                    if model is None:
+                        raise ValueError(f"Сегмент {number} ссылается на отсутствующую модель")
+                    frequencies, cumulative_freq = model
+                
+                model = (frequencies, cumulative_freq)
+                
+                encoded_data = f.read((bits_count + padding) // 8)
+                
+                print(f"Сегмент {number}/{len(offsets)}: распаковка {length} символов...", flush=True)
+                
+                bits = bytes_to_bits(encoded_data, bits_count)
+                
+                coder = ArithmeticCoder()
+                coder.frequencies = frequencies
+                coder.cumulative_freq = cumulative_freq
+                coder.total_freq = total_freq
+                
+                result = coder.decode(bits, length)
+                
+                out.write(''.join(result))
     
     print(f"\n✓ Готово!")
 
@@ -298,10 +949,16 @@ def decompress_file(input_path, output_path):
 if __name__ == "__main__":
     print("=== Арифметическое кодирование ===\n", flush=True)
     
+    if sys.argv[1:2] == ["selfcheck"]:
+        results = [check_parallel_counting(), check_archive()]
+        sys.exit(0 if all(results) else 1)
+    
     if len(sys.argv) < 4:
         print("Использование:")
         print("  python arithmetic_coding.py compress input.txt output.bin")
         print("  python arithmetic_coding.py decompress input.bin output.txt")
+        print("  python arithmetic_coding.py append input.txt archive.bin [--inherit]")
+        print("  python arithmetic_coding.py selfcheck")
         sys.exit(1)
     
     mode, input_file, output_file = sys.argv[1:4]
@@ -311,11 +968,13 @@ if __name__ == "__main__":
             compress_file(input_file, output_file)
         elif mode == "decompress":
             decompress_file(input_file, output_file)
+        elif mode == "append":
+            append_file(input_file, output_file, inherit_model="--inherit" in sys.argv[4:])
         else:
-            print("Режим: compress или decompress")
-    except FileNotFoundError:
-        print(f"Файл '{input_file}' не найден!")
+            print("Режим: compress, decompress или append")
+    except FileNotFoundError as e:
+        print(f"Файл '{e.filename}' не найден!")
     except Exception as e:
         print(f"Ошибка: {e}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()